@@ -6,7 +6,9 @@ from collections import defaultdict
 import os
 import tempfile
 import shutil
+import copy
 import fcntl
+import sys
 from contextlib import contextmanager
 
 # Initialize session state
@@ -47,6 +49,12 @@ USER_DATA_FILE = os.path.join(DATA_DIR, 'user_data.json')
 PENDING_MATCHES_FILE = os.path.join(DATA_DIR, 'pending_matches.json')
 MATCH_HISTORY_FILE = os.path.join(DATA_DIR, 'match_history.json')
 LOCK_FILE = os.path.join(DATA_DIR, '.lock')
+DATA_FILES = [USER_DATA_FILE, PENDING_MATCHES_FILE, MATCH_HISTORY_FILE]
+
+# Backup retention: keep at most this many generations per file, and drop
+# generations older than this many days (the newest one is always kept)
+BACKUP_KEEP_GENERATIONS = 20
+BACKUP_MAX_AGE_DAYS = 30
 
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -72,13 +80,161 @@ def file_lock(lock_file_path, timeout=10):
             except:
                 pass
 
-def atomic_write(file_path, data):
-    """Write JSON data atomically to prevent corruption"""
+def backup_generations(file_path):
+    """List backup generations of a file, newest first"""
+    directory = os.path.dirname(file_path) or '.'
+    prefix = os.path.basename(file_path) + '.backup.'
+    try:
+        names = [n for n in os.listdir(directory) if n.startswith(prefix)]
+    except OSError:
+        return []
+    # Generation suffixes are fixed-width timestamps, so they sort by age
+    return [os.path.join(directory, n) for n in sorted(names, reverse=True)]
+
+def generation_stamp(backup_path):
+    """Timestamp part of a generation name, without any clash counter"""
+    return backup_path.rsplit('.backup.', 1)[1][:len('YYYYmmddTHHMMSSffffff')]
+
+def backup_saves():
+    """Backup generations of all data files grouped by save, newest first.
+
+    save_data stamps all files of one save with the same time, so each
+    entry is (stamp, {file_path: backup_path}) holding the versions that
+    were current just before that save.
+    """
+    saves = defaultdict(dict)
+    for file_path in DATA_FILES:
+        for backup_path in backup_generations(file_path):
+            saves[generation_stamp(backup_path)].setdefault(file_path, backup_path)
+    return sorted(saves.items(), reverse=True)
+
+def prune_backups(file_path):
+    """Remove generations beyond the retention count or older than the max age"""
+    generations = backup_generations(file_path)
+    cutoff = datetime.now().timestamp() - BACKUP_MAX_AGE_DAYS * 86400
+    for idx, backup_path in enumerate(generations):
+        if idx == 0:
+            continue
+        try:
+            if idx >= BACKUP_KEEP_GENERATIONS or os.path.getmtime(backup_path) < cutoff:
+                os.unlink(backup_path)
+        except OSError:
+            pass
+
+def link_generation(source_path, file_path, when):
+    """Link source_path in as a backup generation of file_path stamped with when.
+
+    Never touches an existing generation: on a name clash a counter suffix is
+    added, and the copy fallback only ever creates a brand new file.
+    """
+    stamp = when.strftime('%Y%m%dT%H%M%S%f')
+    counter = 0
+    while True:
+        # Zero-padded counter keeps same-stamp generations in age order
+        suffix = f".{counter:03d}" if counter else ''
+        backup_path = f"{file_path}.backup.{stamp}{suffix}"
+        try:
+            os.link(source_path, backup_path)
+            return backup_path
+        except FileExistsError:
+            counter += 1
+            continue
+        except OSError:
+            # Filesystem without hardlink support - fall back to a copy
+            pass
+        try:
+            with open(source_path, 'rb') as src, open(backup_path, 'xb') as dst:
+                shutil.copyfileobj(src, dst)
+            shutil.copystat(source_path, backup_path)
+            return backup_path
+        except FileExistsError:
+            counter += 1
+
+def migrate_legacy_backup(file_path):
+    """Turn a single <file>.backup from the old scheme into a generation"""
+    legacy_path = file_path + '.backup'
     try:
-        # Create backup if file exists
+        modified = datetime.fromtimestamp(os.path.getmtime(legacy_path))
+        link_generation(legacy_path, file_path, modified)
+        os.unlink(legacy_path)
+    except FileNotFoundError:
+        # No legacy backup, or another process already migrated it
+        pass
+
+def create_backup(file_path, when=None):
+    """Snapshot the current version of a file as a new backup generation.
+
+    The snapshot is a hardlink, so it costs no extra I/O: atomic_write never
+    modifies a file in place, it renames a new file over the old name, leaving
+    the old inode alive under the backup name.
+    """
+    migrate_legacy_backup(file_path)
+    backup_path = link_generation(file_path, file_path, when or datetime.now())
+    prune_backups(file_path)
+    return backup_path
+
+def restore_generation(file_path, backup_path, snapshot_when=None):
+    """Put a backup generation back in place of file_path.
+
+    With snapshot_when, the version being replaced is snapshotted first
+    (stamped with that time) so the restore itself can be undone.
+    """
+    # Copy to a temp file and rename it into place; copying straight onto
+    # file_path could write through a hardlink into another generation
+    temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+    os.close(temp_fd)
+    try:
+        shutil.copy2(backup_path, temp_path)
+        if snapshot_when and os.path.exists(file_path):
+            create_backup(file_path, snapshot_when)
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return backup_path
+
+def restore_backup(file_path, generation=0, keep_current=False):
+    """Restore a single file from a backup generation (0 = newest)"""
+    generations = backup_generations(file_path)
+    if generation < 0 or generation >= len(generations):
+        raise IndexError(f"No backup generation {generation} for {file_path}")
+    return restore_generation(file_path, generations[generation],
+                              datetime.now() if keep_current else None)
+
+def restore_point_in_time(when):
+    """Restore all data files to their newest generation at or before `when`.
+
+    Callers must hold LOCK_FILE so the files are restored as one unit.
+    The replaced versions are snapshotted together, so the restore can
+    itself be undone by restoring to the time it ran. Returns
+    {file_path: backup_path}; files with no generation that old are left
+    as they are and map to None.
+    """
+    stamp = when.strftime('%Y%m%dT%H%M%S%f')
+    chosen = {}
+    for file_path in DATA_FILES:
+        chosen[file_path] = next((b for b in backup_generations(file_path)
+                                  if generation_stamp(b) <= stamp), None)
+    if not any(chosen.values()):
+        raise LookupError(f"No backups at or before {when.isoformat()}")
+    
+    snapshot_when = datetime.now()
+    for file_path, backup_path in chosen.items():
+        if backup_path:
+            restore_generation(file_path, backup_path, snapshot_when)
+    return chosen
+
+def atomic_write(file_path, data, when=None):
+    """Write JSON data atomically to prevent corruption.
+
+    `when` stamps the backup of the replaced version; save_data passes one
+    time for all files so a save can be restored as a whole.
+    """
+    try:
+        # Snapshot the current version before replacing it
         if os.path.exists(file_path):
-            backup_path = file_path + '.backup'
-            shutil.copy2(file_path, backup_path)
+            create_backup(file_path, when)
         
         # Write to temporary file first
         temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), text=True)
@@ -86,7 +242,7 @@ def atomic_write(file_path, data):
             with os.fdopen(temp_fd, 'w') as f:
                 json.dump(data, f, indent=2)
             # Atomic rename (on POSIX systems)
-            shutil.move(temp_path, file_path)
+            os.replace(temp_path, file_path)
             return True
         except Exception as e:
             # Clean up temp file if it exists
@@ -95,77 +251,193 @@ def atomic_write(file_path, data):
             raise e
     except Exception as e:
         st.error(f"Error writing to {file_path}: {str(e)}")
-        # Try to restore from backup
-        backup_path = file_path + '.backup'
-        if os.path.exists(backup_path):
+        # The new file is only renamed in once complete, so on failure the
+        # current one is intact; only fall back to a backup if it's gone
+        if not os.path.exists(file_path) and backup_generations(file_path):
             try:
-                shutil.copy2(backup_path, file_path)
+                restore_backup(file_path)
                 st.warning("Restored from backup")
             except:
                 pass
         return False
 
-def validate_user_data(data):
-    """Validate user data structure"""
-    if not isinstance(data, dict):
-        return False
+# Record types - JSON is parsed into these once at the storage boundary.
+# Keys the app doesn't know about are kept in `extra` and written back.
+PLAYER_DEFAULTS = {
+    'elo': 1500,
+    'matches': 0,
+    'wins': 0,
+    'losses': 0,
+    'point_diff': 0,
+    'points_scored': 0,
+    'points_conceded': 0,
+    'current_streak': 0,
+    'best_streak': 0,
+    'worst_streak': 0
+}
+
+class PlayerStats:
+    """Rating and running stats of one player"""
+    __slots__ = tuple(PLAYER_DEFAULTS) + ('extra',)
     
-    required_fields = ['elo', 'matches', 'wins', 'losses', 'point_diff', 
-                      'points_scored', 'points_conceded', 'current_streak', 
-                      'best_streak', 'worst_streak']
+    def __init__(self, extra=None, **values):
+        unknown = values.keys() - PLAYER_DEFAULTS.keys()
+        if unknown:
+            raise TypeError(f"Unknown player fields: {', '.join(sorted(unknown))}")
+        for field, default in PLAYER_DEFAULTS.items():
+            setattr(self, field, values.get(field, default))
+        self.extra = extra or {}
     
-    for username, user_info in data.items():
-        if not isinstance(user_info, dict):
-            return False
-        for field in required_fields:
-            if field not in user_info:
-                return False
-            if not isinstance(user_info[field], (int, float)):
-                return False
+    @classmethod
+    def from_dict(cls, data):
+        """Build from the on-disk format, raising ValueError if malformed"""
+        if not isinstance(data, dict):
+            raise ValueError("player record is not an object")
+        for field in PLAYER_DEFAULTS:
+            if not isinstance(data.get(field), (int, float)):
+                raise ValueError(f"invalid player field: {field}")
+        return cls(
+            extra={k: v for k, v in data.items() if k not in PLAYER_DEFAULTS},
+            **{field: data[field] for field in PLAYER_DEFAULTS}
+        )
     
-    return True
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in PLAYER_DEFAULTS}
+        data.update(self.extra)
+        return data
 
-def validate_match(match):
-    """Validate match data structure"""
-    required_fields = ['id', 'winner', 'loser', 'winner_score', 'loser_score', 
-                      'submitter', 'confirmer', 'timestamp']
+MATCH_FIELDS = ('id', 'winner', 'loser', 'winner_score', 'loser_score',
+                'submitter', 'confirmer', 'timestamp', 'confirmed',
+                # Filled in by process_confirmed_match
+                'winner_elo_change', 'loser_elo_change',
+                'winner_old_elo', 'loser_old_elo')
+# Pending matches must be complete; history only needs what stats and
+# rendering use, older entries may lack the rest
+PENDING_REQUIRED_FIELDS = ('id', 'winner', 'loser', 'winner_score', 'loser_score',
+                           'submitter', 'confirmer', 'timestamp')
+HISTORY_REQUIRED_FIELDS = ('winner', 'loser', 'winner_score', 'loser_score')
+MATCH_FIELD_SET = frozenset(MATCH_FIELDS)
+
+class Match:
+    """A submitted or confirmed match; fields missing on disk are None.
+
+    A history entry too malformed to parse is kept verbatim in `raw` and
+    treated as unconfirmed, so it is skipped by stats but never lost on save.
+    """
+    __slots__ = MATCH_FIELDS + ('extra', 'raw')
     
-    if not isinstance(match, dict):
-        return False
+    def __init__(self, extra=None, raw=None, **values):
+        unknown = values.keys() - MATCH_FIELD_SET
+        if unknown:
+            raise TypeError(f"Unknown match fields: {', '.join(sorted(unknown))}")
+        self._fill(values.get, extra or {}, raw)
     
-    for field in required_fields:
-        if field not in match:
-            return False
+    def _fill(self, get, extra, raw):
+        """Set every slot, looking field values up with get"""
+        for field in MATCH_FIELDS:
+            setattr(self, field, get(field))
+        self.confirmed = bool(self.confirmed)
+        self.extra = extra
+        self.raw = raw
     
-    # Validate scores
-    if not isinstance(match['winner_score'], (int, float)) or \
-       not isinstance(match['loser_score'], (int, float)):
-        return False
+    @classmethod
+    def from_dict(cls, data, required=PENDING_REQUIRED_FIELDS):
+        """Build from the on-disk format, raising ValueError if malformed"""
+        if not isinstance(data, dict):
+            raise ValueError("match record is not an object")
+        for field in required:
+            if field not in data:
+                raise ValueError(f"missing match field: {field}")
+        if not isinstance(data['winner_score'], (int, float)) or \
+           not isinstance(data['loser_score'], (int, float)):
+            raise ValueError("match scores must be numbers")
+        # Skip __init__ and its kwargs checks, this runs once per history entry
+        match = cls.__new__(cls)
+        extra = {k: v for k, v in data.items() if k not in MATCH_FIELD_SET} \
+            if len(data.keys() - MATCH_FIELD_SET) else {}
+        match._fill(data.get, extra, None)
+        return match
     
-    if match['winner_score'] <= match['loser_score']:
+    def to_dict(self):
+        """Serialize, leaving out fields that were never set"""
+        if self.raw is not None:
+            return self.raw
+        data = {}
+        for field in MATCH_FIELDS:
+            value = getattr(self, field)
+            if value is not None and value is not False:
+                data[field] = value
+        data.update(self.extra)
+        return data
+
+def players_from_dict(data):
+    """Parse on-disk user data into PlayerStats, raising ValueError if malformed"""
+    if not isinstance(data, dict):
+        raise ValueError("user data is not an object")
+    return {username: PlayerStats.from_dict(info) for username, info in data.items()}
+
+def players_to_dict(user_data):
+    return {username: stats.to_dict() for username, stats in user_data.items()}
+
+def pending_from_list(data):
+    """Parse pending matches, dropping incomplete or invalid ones"""
+    if not isinstance(data, list):
+        return []
+    matches = []
+    for item in data:
+        try:
+            match = Match.from_dict(item)
+        except ValueError:
+            continue
+        if validate_match(match):
+            matches.append(match)
+    return matches
+
+def history_from_list(data):
+    """Parse match history, keeping unparseable entries verbatim"""
+    if not isinstance(data, list):
+        return []
+    matches = []
+    for item in data:
+        try:
+            matches.append(Match.from_dict(item, HISTORY_REQUIRED_FIELDS))
+        except ValueError:
+            matches.append(Match(raw=item))
+    return matches
+
+def matches_to_list(matches):
+    return [match.to_dict() for match in matches]
+
+def validate_match(match):
+    """Check a Match against the game rules"""
+    if match.winner_score <= match.loser_score:
         return False
     
-    if match['winner_score'] < 0 or match['loser_score'] < 0:
+    if match.winner_score < 0 or match.loser_score < 0:
         return False
     
     # Reasonable score limit (0-50 should cover all realistic scenarios)
-    if match['winner_score'] > 50 or match['loser_score'] > 50:
+    if match.winner_score > 50 or match.loser_score > 50:
         return False
     
     # Validate players exist
-    if match['winner'] not in USERS or match['loser'] not in USERS:
+    if match.winner not in USERS or match.loser not in USERS:
         return False
     
-    if match['winner'] == match['loser']:
+    if match.winner == match.loser:
         return False
     
     return True
 
 # ELO calculation function
+def expected_score(player_elo, opponent_elo):
+    """Expected score (win probability) of a player against an opponent"""
+    return 1 / (1 + math.pow(10, (opponent_elo - player_elo) / 400))
+
 def calculate_elo(winner_elo, loser_elo, k=32):
     """Calculate new ELO ratings after a match"""
-    expected_winner = 1 / (1 + math.pow(10, (loser_elo - winner_elo) / 400))
-    expected_loser = 1 / (1 + math.pow(10, (winner_elo - loser_elo) / 400))
+    expected_winner = expected_score(winner_elo, loser_elo)
+    expected_loser = expected_score(loser_elo, winner_elo)
     
     new_winner_elo = winner_elo + k * (1 - expected_winner)
     new_loser_elo = loser_elo + k * (0 - expected_loser)
@@ -178,38 +450,24 @@ def calculate_elo(winner_elo, loser_elo, k=32):
 # Initialize user data
 def init_user_data():
     """Initialize all users with default ELO and stats"""
-    user_data = {}
-    for username in USERS.keys():
-        user_data[username] = {
-            'elo': 1500,
-            'matches': 0,
-            'wins': 0,
-            'losses': 0,
-            'point_diff': 0,
-            'points_scored': 0,
-            'points_conceded': 0,
-            'current_streak': 0,
-            'best_streak': 0,
-            'worst_streak': 0
-        }
-    return user_data
+    return {username: PlayerStats() for username in USERS.keys()}
 
 # Calculate statistics
 def calculate_stats(user_data, username):
     """Calculate advanced statistics for a player"""
     data = user_data[username]
     
-    win_rate = (data['wins'] / data['matches'] * 100) if data['matches'] > 0 else 0
-    avg_points_scored = data['points_scored'] / data['matches'] if data['matches'] > 0 else 0
-    avg_points_conceded = data['points_conceded'] / data['matches'] if data['matches'] > 0 else 0
+    win_rate = (data.wins / data.matches * 100) if data.matches > 0 else 0
+    avg_points_scored = data.points_scored / data.matches if data.matches > 0 else 0
+    avg_points_conceded = data.points_conceded / data.matches if data.matches > 0 else 0
     
     return {
         'win_rate': win_rate,
         'avg_points_scored': avg_points_scored,
         'avg_points_conceded': avg_points_conceded,
-        'current_streak': data['current_streak'],
-        'best_streak': data['best_streak'],
-        'worst_streak': data['worst_streak']
+        'current_streak': data.current_streak,
+        'best_streak': data.best_streak,
+        'worst_streak': data.worst_streak
     }
 
 def get_head_to_head(match_history, player1, player2):
@@ -220,15 +478,15 @@ def get_head_to_head(match_history, player1, player2):
     p2_points = 0
     
     for match in match_history:
-        if match.get('confirmed', False):
-            if (match['winner'] == player1 and match['loser'] == player2):
+        if match.confirmed:
+            if (match.winner == player1 and match.loser == player2):
                 p1_wins += 1
-                p1_points += match['winner_score']
-                p2_points += match['loser_score']
-            elif (match['winner'] == player2 and match['loser'] == player1):
+                p1_points += match.winner_score
+                p2_points += match.loser_score
+            elif (match.winner == player2 and match.loser == player1):
                 p2_wins += 1
-                p2_points += match['winner_score']
-                p1_points += match['loser_score']
+                p2_points += match.winner_score
+                p1_points += match.loser_score
     
     return {
         'p1_wins': p1_wins,
@@ -238,6 +496,115 @@ def get_head_to_head(match_history, player1, player2):
         'total_matches': p1_wins + p2_wins
     }
 
+def head_to_head_counts(match_history):
+    """Count confirmed matches between every pair of players in one pass"""
+    counts = defaultdict(int)
+    for match in match_history:
+        if match.confirmed:
+            counts[frozenset((match.winner, match.loser))] += 1
+    # Plain dict, so lookups of unplayed pairs don't add keys to a cached copy
+    return dict(counts)
+
+@st.cache_data(max_entries=4)
+def win_probability_matrix(ratings):
+    """All-pairs win probabilities for a tuple of (username, elo) pairs.
+
+    The ratings tuple doubles as the data version: the matrix is only
+    recomputed when someone's ELO changes. Only the current version is
+    useful, so just a few entries are kept.
+    """
+    # Each pair only needs one pow() call, the reverse is its complement
+    matrix = {username: {} for username, _ in ratings}
+    for i, (p1, elo1) in enumerate(ratings):
+        for p2, elo2 in ratings[i + 1:]:
+            prob = expected_score(elo1, elo2)
+            matrix[p1][p2] = prob
+            matrix[p2][p1] = 1 - prob
+    return matrix
+
+def current_ratings(user_data):
+    """Hashable snapshot of current ratings, used as the matrix cache key"""
+    return tuple(sorted((username, data.elo) for username, data in user_data.items()))
+
+def suggest_opponents(user_data, match_history, username, limit=3):
+    """Opponents closest to an even match, preferring the least played"""
+    matrix = win_probability_matrix(current_ratings(user_data))
+    counts = history_pair_counts(match_history)
+    
+    # Win chances within the same 5% bucket count as equally balanced,
+    # so the least played opponent wins the tie
+    candidates = [p for p in matrix.get(username, {}) if p in USERS]
+    candidates.sort(key=lambda p: (round(abs(matrix[username][p] - 0.5) * 20),
+                                   counts.get(frozenset((username, p)), 0),
+                                   abs(matrix[username][p] - 0.5)))
+    
+    return [{
+        'opponent': p,
+        'win_prob': matrix[username][p],
+        'played': counts.get(frozenset((username, p)), 0)
+    } for p in candidates[:limit]]
+
+def generate_pairings(user_data, players):
+    """Pair players so the total rating gap across all tables is minimal.
+
+    Pairing neighbours in rating order is optimal, so this is a sort plus a
+    linear scan. With an odd number of players, the bye goes to whoever
+    leaves the smallest total gap; that player always sits at an even index
+    in rating order so everyone else still pairs with a neighbour.
+    Returns (pairings, bye) where pairings is a list of (player1, player2).
+    """
+    ordered = sorted(players, key=lambda p: user_data[p].elo, reverse=True)
+    elos = [user_data[p].elo for p in ordered]
+    n = len(ordered)
+    
+    bye = None
+    if n % 2 == 1:
+        # prefix[i]: gap of pairing ordered[:2i]; suffix[i]: gap of pairing ordered[2i+1:]
+        half = n // 2
+        prefix = [0] * (half + 1)
+        for i in range(half):
+            prefix[i + 1] = prefix[i] + abs(elos[2 * i] - elos[2 * i + 1])
+        suffix = [0] * (half + 1)
+        for i in range(half - 1, -1, -1):
+            suffix[i] = suffix[i + 1] + abs(elos[2 * i + 1] - elos[2 * i + 2])
+        bye_idx = 2 * min(range(half + 1), key=lambda i: prefix[i] + suffix[i])
+        bye = ordered.pop(bye_idx)
+    
+    pairings = [(ordered[i], ordered[i + 1]) for i in range(0, len(ordered) - 1, 2)]
+    return pairings, bye
+
+def file_signature(file_path):
+    """Identify a file version; atomic_write swaps in a new inode on every write"""
+    stat = os.stat(file_path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+RECORD_PARSERS = {
+    USER_DATA_FILE: players_from_dict,
+    PENDING_MATCHES_FILE: pending_from_list,
+    MATCH_HISTORY_FILE: history_from_list
+}
+
+@st.cache_resource(max_entries=6)
+def read_records(file_path, signature):
+    """Parse a data file into records, once per file version.
+
+    The result is shared across sessions and reruns, so callers must not
+    mutate it - load_data hands out copies of anything the app modifies.
+    """
+    with open(file_path, 'r') as f:
+        return RECORD_PARSERS[file_path](json.load(f))
+
+@st.cache_resource(max_entries=2)
+def pair_counts_for_version(signature):
+    """Head-to-head pair counts of one version of the history file"""
+    return head_to_head_counts(read_records(MATCH_HISTORY_FILE, signature))
+
+def history_pair_counts(match_history):
+    """Pair counts for the loaded history, computed once per file version"""
+    if os.path.exists(MATCH_HISTORY_FILE):
+        return pair_counts_for_version(file_signature(MATCH_HISTORY_FILE))
+    return head_to_head_counts(match_history)
+
 # Load data from storage with proper error handling
 def load_data():
     """Load user data, pending matches, and match history from JSON files"""
@@ -246,45 +613,36 @@ def load_data():
             # Load user data
             try:
                 if os.path.exists(USER_DATA_FILE):
-                    with open(USER_DATA_FILE, 'r') as f:
-                        user_data = json.load(f)
-                    
-                    # Validate loaded data
-                    if not validate_user_data(user_data):
+                    # Decode errors go to the outer handler below; records
+                    # that parse but don't fit the schema reinitialize
+                    try:
+                        cached = read_records(USER_DATA_FILE, file_signature(USER_DATA_FILE))
+                        user_data = {username: copy.copy(stats) for username, stats in cached.items()}
+                    except json.JSONDecodeError:
+                        raise
+                    except ValueError:
                         st.warning("User data corrupted, reinitializing...")
                         user_data = init_user_data()
-                        atomic_write(USER_DATA_FILE, user_data)
+                        atomic_write(USER_DATA_FILE, players_to_dict(user_data))
                     
                     # Add any new users from USERS dict
                     for username in USERS.keys():
                         if username not in user_data:
-                            user_data[username] = {
-                                'elo': 1500,
-                                'matches': 0,
-                                'wins': 0,
-                                'losses': 0,
-                                'point_diff': 0,
-                                'points_scored': 0,
-                                'points_conceded': 0,
-                                'current_streak': 0,
-                                'best_streak': 0,
-                                'worst_streak': 0
-                            }
+                            user_data[username] = PlayerStats()
                 else:
                     user_data = init_user_data()
-                    atomic_write(USER_DATA_FILE, user_data)
+                    atomic_write(USER_DATA_FILE, players_to_dict(user_data))
             except (json.JSONDecodeError, IOError) as e:
                 st.error(f"Error loading user data: {str(e)}")
                 user_data = init_user_data()
-                atomic_write(USER_DATA_FILE, user_data)
+                atomic_write(USER_DATA_FILE, players_to_dict(user_data))
             
             # Load pending matches
             try:
                 if os.path.exists(PENDING_MATCHES_FILE):
-                    with open(PENDING_MATCHES_FILE, 'r') as f:
-                        pending_matches = json.load(f)
-                    # Validate each match
-                    pending_matches = [m for m in pending_matches if validate_match(m)]
+                    # Pending matches get updated when confirmed, so copy them
+                    cached = read_records(PENDING_MATCHES_FILE, file_signature(PENDING_MATCHES_FILE))
+                    pending_matches = [copy.copy(m) for m in cached]
                 else:
                     pending_matches = []
             except (json.JSONDecodeError, IOError) as e:
@@ -294,11 +652,9 @@ def load_data():
             # Load match history
             try:
                 if os.path.exists(MATCH_HISTORY_FILE):
-                    with open(MATCH_HISTORY_FILE, 'r') as f:
-                        match_history = json.load(f)
-                    # Basic validation
-                    if not isinstance(match_history, list):
-                        match_history = []
+                    # History entries are never modified, only the list is
+                    cached = read_records(MATCH_HISTORY_FILE, file_signature(MATCH_HISTORY_FILE))
+                    match_history = list(cached)
                 else:
                     match_history = []
             except (json.JSONDecodeError, IOError) as e:
@@ -317,15 +673,14 @@ def save_data(user_data, pending_matches, match_history):
     try:
         with file_lock(LOCK_FILE):
             success = True
+            saved_at = datetime.now()
             
-            # Validate before saving
-            if not validate_user_data(user_data):
-                st.error("Invalid user data, not saving")
-                return False
+            success &= atomic_write(USER_DATA_FILE, players_to_dict(user_data), saved_at)
+            success &= atomic_write(PENDING_MATCHES_FILE, matches_to_list(pending_matches), saved_at)
+            success &= atomic_write(MATCH_HISTORY_FILE, matches_to_list(match_history), saved_at)
             
-            success &= atomic_write(USER_DATA_FILE, user_data)
-            success &= atomic_write(PENDING_MATCHES_FILE, pending_matches)
-            success &= atomic_write(MATCH_HISTORY_FILE, match_history)
+            # Drop parsed versions of the files just replaced
+            read_records.clear()
             
             return success
     except Exception as e:
@@ -334,25 +689,25 @@ def save_data(user_data, pending_matches, match_history):
 
 def update_streak(user_data, username, won):
     """Update win/loss streak for a player"""
-    current = user_data[username]['current_streak']
+    current = user_data[username].current_streak
     
     if won:
         if current >= 0:
-            user_data[username]['current_streak'] = current + 1
+            user_data[username].current_streak = current + 1
         else:
-            user_data[username]['current_streak'] = 1
+            user_data[username].current_streak = 1
     else:
         if current <= 0:
-            user_data[username]['current_streak'] = current - 1
+            user_data[username].current_streak = current - 1
         else:
-            user_data[username]['current_streak'] = -1
+            user_data[username].current_streak = -1
     
     # Update best/worst streaks
-    new_streak = user_data[username]['current_streak']
-    if new_streak > user_data[username]['best_streak']:
-        user_data[username]['best_streak'] = new_streak
-    if new_streak < user_data[username]['worst_streak']:
-        user_data[username]['worst_streak'] = new_streak
+    new_streak = user_data[username].current_streak
+    if new_streak > user_data[username].best_streak:
+        user_data[username].best_streak = new_streak
+    if new_streak < user_data[username].worst_streak:
+        user_data[username].worst_streak = new_streak
 
 # Login page
 def login_page():
@@ -375,19 +730,19 @@ def submit_match_page(user_data, pending_matches, match_history):
     st.subheader("📝 Submit Match Result")
     
     # Check for pending confirmations for current user
-    user_pending = [m for m in pending_matches if m['confirmer'] == st.session_state.username]
+    user_pending = [m for m in pending_matches if m.confirmer == st.session_state.username]
     
     if user_pending:
         st.warning(f"⏳ **{len(user_pending)} match(es) awaiting your confirmation**")
         
         for match in user_pending:
-            st.write(f"**{match['winner']}** defeated **{match['loser']}**")
-            st.write(f"Score: {match['winner_score']} - {match['loser_score']}")
-            st.write(f"Submitted by: {match['submitter']}")
+            st.write(f"**{match.winner}** defeated **{match.loser}**")
+            st.write(f"Score: {match.winner_score} - {match.loser_score}")
+            st.write(f"Submitted by: {match.submitter}")
             
             col1, col2 = st.columns(2)
             with col1:
-                if st.button("✅ Confirm", key=f"confirm_{match['id']}", use_container_width=True):
+                if st.button("✅ Confirm", key=f"confirm_{match.id}", use_container_width=True):
                     process_confirmed_match(match, user_data, match_history)
                     pending_matches.remove(match)
                     if save_data(user_data, pending_matches, match_history):
@@ -397,7 +752,7 @@ def submit_match_page(user_data, pending_matches, match_history):
                         st.error("Error saving data, please try again")
             
             with col2:
-                if st.button("❌ Reject", key=f"reject_{match['id']}", use_container_width=True):
+                if st.button("❌ Reject", key=f"reject_{match.id}", use_container_width=True):
                     pending_matches.remove(match)
                     if save_data(user_data, pending_matches, match_history):
                         st.info("Match rejected")
@@ -407,6 +762,15 @@ def submit_match_page(user_data, pending_matches, match_history):
             
             st.divider()
     
+    # Suggested opponents
+    suggestions = suggest_opponents(user_data, match_history, st.session_state.username)
+    if suggestions:
+        st.write("### 🎯 Suggested Opponents")
+        for suggestion in suggestions:
+            st.write(f"**{suggestion['opponent']}** - win chance {suggestion['win_prob'] * 100:.0f}%, "
+                     f"played {suggestion['played']} time(s)")
+        st.divider()
+    
     # Submit new match
     st.write("### Submit New Match")
     
@@ -431,16 +795,16 @@ def submit_match_page(user_data, pending_matches, match_history):
             winner_score = max(your_score, opponent_score)
             loser_score = min(your_score, opponent_score)
             
-            match = {
-                'id': datetime.now().isoformat(),
-                'winner': winner,
-                'loser': loser,
-                'winner_score': int(winner_score),
-                'loser_score': int(loser_score),
-                'submitter': st.session_state.username,
-                'confirmer': opponent,
-                'timestamp': datetime.now().isoformat()
-            }
+            match = Match(
+                id=datetime.now().isoformat(),
+                winner=winner,
+                loser=loser,
+                winner_score=int(winner_score),
+                loser_score=int(loser_score),
+                submitter=st.session_state.username,
+                confirmer=opponent,
+                timestamp=datetime.now().isoformat()
+            )
             
             # Validate match before adding
             if validate_match(match):
@@ -453,10 +817,27 @@ def submit_match_page(user_data, pending_matches, match_history):
             else:
                 st.error("Invalid match data, please check your inputs")
 
+    # Pairing generator for round-robins and table nights
+    st.divider()
+    with st.expander("🎲 Generate Pairings"):
+        present = st.multiselect("Players present", list(USERS.keys()))
+        if st.button("Generate", use_container_width=True):
+            if len(present) < 2:
+                st.error("❌ Select at least two players")
+            else:
+                matrix = win_probability_matrix(current_ratings(user_data))
+                pairings, bye = generate_pairings(user_data, present)
+                for table, (p1, p2) in enumerate(pairings, 1):
+                    st.write(f"**Table {table}:** {p1} ({user_data[p1].elo}) vs "
+                             f"{p2} ({user_data[p2].elo}) - {matrix[p1][p2] * 100:.0f}% / "
+                             f"{matrix[p2][p1] * 100:.0f}%")
+                if bye:
+                    st.write(f"**Bye:** {bye}")
+
 def process_confirmed_match(match, user_data, match_history):
     """Process a confirmed match and update ELO ratings"""
-    winner = match['winner']
-    loser = match['loser']
+    winner = match.winner
+    loser = match.loser
     
     # Validate players exist in user_data
     if winner not in user_data or loser not in user_data:
@@ -465,36 +846,36 @@ def process_confirmed_match(match, user_data, match_history):
     
     # Calculate new ELOs with changes
     new_winner_elo, new_loser_elo, winner_change, loser_change = calculate_elo(
-        user_data[winner]['elo'],
-        user_data[loser]['elo']
+        user_data[winner].elo,
+        user_data[loser].elo
     )
     
     # Store ELO changes in match
-    match['winner_elo_change'] = winner_change
-    match['loser_elo_change'] = loser_change
-    match['winner_old_elo'] = user_data[winner]['elo']
-    match['loser_old_elo'] = user_data[loser]['elo']
+    match.winner_elo_change = winner_change
+    match.loser_elo_change = loser_change
+    match.winner_old_elo = user_data[winner].elo
+    match.loser_old_elo = user_data[loser].elo
     
     # Update winner stats
-    user_data[winner]['elo'] = new_winner_elo
-    user_data[winner]['matches'] += 1
-    user_data[winner]['wins'] += 1
-    user_data[winner]['point_diff'] += (match['winner_score'] - match['loser_score'])
-    user_data[winner]['points_scored'] += match['winner_score']
-    user_data[winner]['points_conceded'] += match['loser_score']
+    user_data[winner].elo = new_winner_elo
+    user_data[winner].matches += 1
+    user_data[winner].wins += 1
+    user_data[winner].point_diff += (match.winner_score - match.loser_score)
+    user_data[winner].points_scored += match.winner_score
+    user_data[winner].points_conceded += match.loser_score
     update_streak(user_data, winner, True)
     
     # Update loser stats
-    user_data[loser]['elo'] = new_loser_elo
-    user_data[loser]['matches'] += 1
-    user_data[loser]['losses'] += 1
-    user_data[loser]['point_diff'] -= (match['winner_score'] - match['loser_score'])
-    user_data[loser]['points_scored'] += match['loser_score']
-    user_data[loser]['points_conceded'] += match['winner_score']
+    user_data[loser].elo = new_loser_elo
+    user_data[loser].matches += 1
+    user_data[loser].losses += 1
+    user_data[loser].point_diff -= (match.winner_score - match.loser_score)
+    user_data[loser].points_scored += match.loser_score
+    user_data[loser].points_conceded += match.winner_score
     update_streak(user_data, loser, False)
     
     # Add to history
-    match['confirmed'] = True
+    match.confirmed = True
     match_history.insert(0, match)
 
 # Leaderboard page
@@ -502,7 +883,7 @@ def leaderboard_page(user_data):
     st.subheader("🏆 Leaderboard")
     
     # Sort by ELO
-    sorted_players = sorted(user_data.items(), key=lambda x: x[1]['elo'], reverse=True)
+    sorted_players = sorted(user_data.items(), key=lambda x: x[1].elo, reverse=True)
     
     # Display leaderboard
     for idx, (username, data) in enumerate(sorted_players, 1):
@@ -524,14 +905,14 @@ def leaderboard_page(user_data):
             st.write(f"**{username}**")
         
         with col3:
-            st.write(f"ELO: **{data['elo']}**")
+            st.write(f"ELO: **{data.elo}**")
         
         with col4:
-            st.write(f"W/L: {data['wins']}/{data['losses']}")
+            st.write(f"W/L: {data.wins}/{data.losses}")
         
         with col5:
-            diff_color = "green" if data['point_diff'] >= 0 else "red"
-            st.write(f"PD: :{diff_color}[**{data['point_diff']:+d}**]")
+            diff_color = "green" if data.point_diff >= 0 else "red"
+            st.write(f"PD: :{diff_color}[**{data.point_diff:+d}**]")
         
         with col6:
             win_rate_color = "green" if stats['win_rate'] >= 50 else "red"
@@ -559,17 +940,17 @@ def player_stats_page(user_data, match_history):
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("ELO Rating", data['elo'])
+        st.metric("ELO Rating", data.elo)
     
     with col2:
         st.metric("Win Rate", f"{stats['win_rate']:.1f}%")
     
     with col3:
-        st.metric("Total Matches", data['matches'])
+        st.metric("Total Matches", data.matches)
     
     with col4:
-        st.metric("Point Difference", data['point_diff'], 
-                 delta_color="normal" if data['point_diff'] >= 0 else "inverse")
+        st.metric("Point Difference", data.point_diff, 
+                 delta_color="normal" if data.point_diff >= 0 else "inverse")
     
     st.divider()
     
@@ -578,10 +959,10 @@ def player_stats_page(user_data, match_history):
     
     with col1:
         st.write("### 🎯 Performance")
-        st.write(f"**Wins:** {data['wins']}")
-        st.write(f"**Losses:** {data['losses']}")
-        st.write(f"**Points Scored:** {data['points_scored']}")
-        st.write(f"**Points Conceded:** {data['points_conceded']}")
+        st.write(f"**Wins:** {data.wins}")
+        st.write(f"**Losses:** {data.losses}")
+        st.write(f"**Points Scored:** {data.points_scored}")
+        st.write(f"**Points Conceded:** {data.points_conceded}")
         st.write(f"**Avg Points Scored:** {stats['avg_points_scored']:.2f}")
         st.write(f"**Avg Points Conceded:** {stats['avg_points_conceded']:.2f}")
     
@@ -634,15 +1015,15 @@ def match_history_page(match_history):
         return
     
     for match in match_history[:30]:  # Show last 30 matches
-        if match.get('confirmed', False):
-            winner_elo_change = match.get('winner_elo_change', 0)
-            loser_elo_change = match.get('loser_elo_change', 0)
+        if match.confirmed:
+            winner_elo_change = match.winner_elo_change or 0
+            loser_elo_change = match.loser_elo_change or 0
             
-            st.write(f"**{match['winner']}** defeated **{match['loser']}**")
-            st.write(f"Score: {match['winner_score']} - {match['loser_score']} | ELO: :green[{match['winner']} +{winner_elo_change}] :red[{match['loser']} {loser_elo_change}]")
+            st.write(f"**{match.winner}** defeated **{match.loser}**")
+            st.write(f"Score: {match.winner_score} - {match.loser_score} | ELO: :green[{match.winner} +{winner_elo_change}] :red[{match.loser} {loser_elo_change}]")
             
             # FIXED: Added safe timestamp handling
-            timestamp = match.get('timestamp', 'Unknown date')
+            timestamp = match.timestamp or 'Unknown date'
             if timestamp and timestamp != 'Unknown date':
                 try:
                     st.write(f"Date: {timestamp[:10]}")
@@ -681,7 +1062,7 @@ def main():
         st.title("🏓 Ping Pong Leaderboard")
         
         # Show pending count
-        user_pending_count = len([m for m in pending_matches if m['confirmer'] == st.session_state.username])
+        user_pending_count = len([m for m in pending_matches if m.confirmer == st.session_state.username])
         if user_pending_count > 0:
             st.info(f"⏳ You have **{user_pending_count}** pending match confirmation(s)")
         
@@ -709,5 +1090,85 @@ def main():
                 st.session_state.username = None
                 st.rerun()
 
+def backup_cli(args):
+    """Command line backup management:
+
+    python app.py backups                         list saves, newest first
+    python app.py backups <file>                  list generations of one file
+    python app.py restore-at <time>               restore all data files to a save
+    python app.py restore <file> [generation]     restore one file (default 0)
+
+    <time> is an ISO date/time or a save stamp from the listing.
+    """
+    commands = ('backups', 'restore', 'restore-at')
+    if not args or args[0] not in commands or (args[0] != 'backups' and len(args) < 2):
+        print(backup_cli.__doc__)
+        return 1
+    
+    if args[0] == 'restore-at':
+        try:
+            try:
+                when = datetime.strptime(args[1], '%Y%m%dT%H%M%S%f')
+            except ValueError:
+                when = datetime.fromisoformat(args[1])
+        except ValueError:
+            print(f"Invalid time: {args[1]}")
+            print(backup_cli.__doc__)
+            return 1
+        try:
+            with file_lock(LOCK_FILE):
+                for file_path in DATA_FILES:
+                    migrate_legacy_backup(file_path)
+                restored = restore_point_in_time(when)
+        except Exception as e:
+            print(f"Restore failed: {str(e)}")
+            return 1
+        for file_path, backup_path in restored.items():
+            print(f"Restored {file_path} from {backup_path}" if backup_path
+                  else f"Left {file_path} as is, no backup that old")
+        return 0
+    
+    file_path = args[1] if len(args) > 1 else None
+    if file_path and not os.path.dirname(file_path):
+        file_path = os.path.join(DATA_DIR, file_path)
+    
+    if args[0] == 'backups':
+        try:
+            with file_lock(LOCK_FILE):
+                for path in ([file_path] if file_path else DATA_FILES):
+                    migrate_legacy_backup(path)
+                if file_path:
+                    for idx, backup_path in enumerate(backup_generations(file_path)):
+                        modified = datetime.fromtimestamp(os.path.getmtime(backup_path)).isoformat(timespec='seconds')
+                        print(f"{idx:3d}  {modified}  {backup_path}")
+                else:
+                    for stamp, backups in backup_saves():
+                        saved = datetime.strptime(stamp, '%Y%m%dT%H%M%S%f').isoformat(timespec='seconds')
+                        files = ', '.join(os.path.basename(path) for path in backups)
+                        print(f"{stamp}  before save at {saved}  {files}")
+        except Exception as e:
+            print(f"Listing backups failed: {str(e)}")
+            return 1
+        return 0
+    
+    try:
+        generation = int(args[2]) if len(args) > 2 else 0
+    except ValueError:
+        print(f"Invalid generation: {args[2]}")
+        print(backup_cli.__doc__)
+        return 1
+    
+    try:
+        with file_lock(LOCK_FILE):
+            migrate_legacy_backup(file_path)
+            restored_from = restore_backup(file_path, generation, keep_current=True)
+    except Exception as e:
+        print(f"Restore failed: {str(e)}")
+        return 1
+    print(f"Restored {file_path} from {restored_from}")
+    return 0
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(backup_cli(sys.argv[1:]))
     main()